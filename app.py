@@ -1,12 +1,21 @@
+import asyncio
+import io
 import os
-import re
 import time
+import uuid
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import BinaryIO, Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
 
+import msgpack
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -22,10 +31,38 @@ STATIC_DIR.mkdir(exist_ok=True)
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 STICKER_DIR.mkdir(parents=True, exist_ok=True)
 
+# ----------------------------
+# 上传大小限制
+# ----------------------------
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB，按需调整
+UPLOAD_FORM_OVERHEAD = 64 * 1024    # multipart 边界与表单头的余量
+TOO_LARGE = "文件过大（>10MB）"
+
+class UploadSizeLimit:
+    """按 Content-Length 提前拒绝过大的上传：表单在进入处理函数前就会被整体解析，只能在这一层拦截"""
+    def __init__(self, app, path: str = "/upload"):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            for key, value in scope["headers"]:
+                if key == b"content-length":
+                    if value.isdigit() and int(value) > MAX_UPLOAD_SIZE + UPLOAD_FORM_OVERHEAD:
+                        response = ORJSONResponse({"detail": TOO_LARGE}, status_code=413)
+                        await response(scope, receive, send)
+                        return
+                    break
+        # 无 Content-Length（分块上传）时仍由处理函数中的流式校验兜底
+        await self.app(scope, receive, send)
+
 # ----------------------------
 # FastAPI 初始化
 # ----------------------------
-app = FastAPI(title="MiniChat")
+app = FastAPI(title="MiniChat", default_response_class=ORJSONResponse)
+
+# 先注册上传限制、再注册 CORS：后注册的在外层，提前返回的 413 也会带上 CORS 头
+app.add_middleware(UploadSizeLimit)
 
 # 如需跨域，放开这里（按需添加你的前端域名）
 app.add_middleware(
@@ -44,20 +81,29 @@ app.mount("/static", StaticFiles(directory=str(STATIC_DIR), html=False), name="s
 # ----------------------------
 # 允许：中文字符、英文字母、数字、点、下划线、短横、空格
 # 移除：路径分隔符、控制字符、其它危险字符
-FNAME_ALLOWED = re.compile(r"[^0-9A-Za-z\u4e00-\u9fff._\- ]+")
+_FNAME_ALLOWED = [
+    *range(0x30, 0x3A), *range(0x41, 0x5B), *range(0x61, 0x7B),  # 0-9 A-Z a-z
+    *range(0x4E00, 0x9FFF + 1),                                 # 中文
+    0x2E, 0x5F, 0x2D, 0x20,                                     # . _ - 空格
+]
+
+class _FnameTable(dict):
+    """str.translate 映射表：导入时只收录允许的字符（映射为自身）；其余一律映射为 None（删除），不写回缓存"""
+    def __missing__(self, cp: int):
+        return None
+
+FNAME_TABLE = _FnameTable((cp, cp) for cp in _FNAME_ALLOWED)
 
 def sanitize_filename(name: str) -> str:
     # 仅取 basename，避免 ../
     name = os.path.basename(name)
-    # 去除控制字符
-    name = "".join(ch for ch in name if ch.isprintable())
-    # 过滤危险字符但保留中文
-    name = FNAME_ALLOWED.sub("", name)
+    # 一次 translate 过滤控制字符与危险字符，保留中文
+    name = name.translate(FNAME_TABLE)
+    # 压缩多余空格
+    name = " ".join(name.split())
     # 空名则给默认名
     if not name or name in {".", ".."}:
         name = "file"
-    # 压缩多余空格
-    name = re.sub(r"\s+", " ", name).strip()
     return name
 
 def unique_path(dir_path: Path, filename: str) -> Path:
@@ -65,71 +111,297 @@ def unique_path(dir_path: Path, filename: str) -> Path:
     candidate = dir_path / filename
     if not candidate.exists():
         return candidate
-    stem = Path(filename).stem
-    suffix = Path(filename).suffix
+    stem, suffix = candidate.stem, candidate.suffix
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     return dir_path / f"{stem}_{ts}{suffix}"
 
+def _sendfile_copy(src: BinaryIO, dest: Path, limit: int) -> Optional[int]:
+    """src 已落盘时用 sendfile 在内核内完成拷贝；不支持（内存中的文件、非 Linux）时返回 None"""
+    # 与 Starlette 判断 UploadFile 是否在内存中的方式一致
+    if not getattr(src, "_rolled", True) or not hasattr(os, "sendfile"):
+        return None
+    try:
+        in_fd = src.fileno()
+        offset = src.tell()
+        size = os.fstat(in_fd).st_size - offset
+    except (OSError, io.UnsupportedOperation):
+        return None
+    if size > limit:
+        return size
+    try:
+        with dest.open("wb") as f:
+            sent = 0
+            while sent < size:
+                n = os.sendfile(f.fileno(), in_fd, offset + sent, size - sent)
+                if n == 0:
+                    break
+                sent += n
+    except OSError:
+        return None
+    return sent
+
+def save_stream(src: BinaryIO, dest: Path, limit: int) -> int:
+    """把 src 写入 dest（阻塞，需在线程池中调用）；超过 limit 即停止，返回已读取的字节数"""
+    size = _sendfile_copy(src, dest, limit)
+    if size is not None:
+        return size
+    # 回退：用户态分块拷贝（sendfile 使用显式偏移，不会移动 src 的读位置）
+    size = 0
+    with dest.open("wb") as f:
+        while True:
+            chunk = src.read(1024 * 1024)  # 1MB
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                break
+            f.write(chunk)
+    return size
+
+_ts_cache = ["", -1]  # [格式化结果, 对应的整秒]
+
+def now_ts() -> str:
+    """消息时间戳 HH:MM:SS；同一秒内复用已格式化的字符串"""
+    sec = int(time.time())
+    if sec != _ts_cache[1]:
+        _ts_cache[0] = time.strftime("%H:%M:%S", time.localtime(sec))
+        _ts_cache[1] = sec
+    return _ts_cache[0]
+
+# ----------------------------
+# 编解码：默认 JSON，客户端可通过子协议协商 msgpack
+# ----------------------------
+def msgpack_dumps(obj) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+def msgpack_loads(data):
+    return msgpack.unpackb(data, raw=False)
+
+# 批量帧：{"type": "batch", "items": [...]}，直接拼接已编码的帧，无需重新编码
+def json_batch(frames: List[bytes]) -> bytes:
+    return b'{"type":"batch","items":[' + b",".join(frames) + b"]}"
+
+_MSGPACK_BATCH_HEAD = b"\x82" + msgpack_dumps("type") + msgpack_dumps("batch") + msgpack_dumps("items")
+
+def msgpack_batch(frames: List[bytes]) -> bytes:
+    return _MSGPACK_BATCH_HEAD + msgpack.Packer().pack_array_header(len(frames)) + b"".join(frames)
+
+class Codec(NamedTuple):
+    dumps: Callable
+    loads: Callable
+    batch: Callable
+
+# "json" 为默认，其余名称即 WebSocket 子协议名
+CODECS: Dict[str, Codec] = {
+    "json": Codec(orjson.dumps, orjson.loads, json_batch),
+    "msgpack": Codec(msgpack_dumps, msgpack_loads, msgpack_batch),
+}
+
+# 下发帧格式：超过 COMPRESS_MIN 的帧整体 zlib 压缩一次并加 1 字节前缀，所有订阅者复用同一份压缩结果
+# （JSON 帧以 "{" 开头、msgpack 帧以 map 头开头，不会与前缀冲突）
+COMPRESSED = b"\x01"
+COMPRESS_MIN = 512
+
+def encode_frame(codec: str, message: Dict) -> bytes:
+    frame = CODECS[codec].dumps(message)
+    if len(frame) > COMPRESS_MIN:
+        packed = COMPRESSED + zlib.compress(frame, 1)
+        if len(packed) < len(frame):
+            return packed
+    return frame
+
+@lru_cache(maxsize=32)
+def notice_frame(codec: str, text: str) -> bytes:
+    """系统提示帧（仅用于固定文案），按 (编码, 文案) 缓存"""
+    return encode_frame(codec, {"type": "system", "data": text})
+
+def coalesce(frames: List[bytes], batch: Callable) -> List[bytes]:
+    """相邻的未压缩帧合并成 batch 帧；压缩帧无法拼接，单独发送"""
+    out: List[bytes] = []
+    run: List[bytes] = []
+    for frame in frames:
+        if frame.startswith(COMPRESSED):
+            if run:
+                out.append(run[0] if len(run) == 1 else batch(run))
+                run = []
+            out.append(frame)
+        else:
+            run.append(frame)
+    if run:
+        out.append(run[0] if len(run) == 1 else batch(run))
+    return out
+
+def negotiate_codec(websocket: WebSocket) -> str:
+    """按客户端请求的子协议选择编解码，未请求则使用 JSON"""
+    for proto in websocket.scope.get("subprotocols", []):
+        if proto in CODECS and proto != "json":
+            return proto
+    return "json"
+
 # ----------------------------
 # WebSocket 连接与消息管理
 # ----------------------------
+SEND_QUEUE_SIZE = 256  # 每个连接最多积压的待发帧数，超出视为慢客户端并断开
+SEND_BATCH_MAX = 32    # 写协程一次最多合并的帧数
+DRAIN_TIMEOUT = 2.0    # 断开时等待写协程发完剩余帧的最长秒数
+
+@dataclass
+class Conn:
+    ws: WebSocket
+    username: str
+    codec: str = "json"
+    # 待发帧队列，由该连接独立的写协程消费；None 表示发完剩余帧后退出
+    queue: "asyncio.Queue[Optional[bytes]]" = field(
+        default_factory=lambda: asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+    )
+    task: Optional[asyncio.Task] = None
+    closing: bool = False
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
-        self.usernames: Dict[WebSocket, str] = {}
-        self.history: List[Dict] = []  # 保存最近 N 条消息
+        self.conns: Dict[WebSocket, Conn] = {}  # 在线连接：键即在线集合，值含用户名/编码/发送队列
+        self._snapshot: Tuple[Conn, ...] = ()   # conns 的只读快照，供广播遍历；仅在进出时重建
         self.max_history = 20
-
-    async def connect(self, websocket: WebSocket, username: str):
-        await websocket.accept()
-        self.active_connections.add(websocket)
-        self.usernames[websocket] = username
+        self.history: Deque[Dict] = deque(maxlen=self.max_history)  # 保存最近 N 条消息，超出自动淘汰最旧的
+        self._history_frames: Dict[str, bytes] = {}  # 编码后的历史帧缓存，历史变化时清空
+        # 在线列表消息及其编码帧缓存，仅在有人进出时失效
+        self._participants: Optional[Dict] = None
+        self._participants_frames: Dict[str, bytes] = {}
+        self._background: Set[asyncio.Task] = set()  # 持有后台任务引用，避免被回收
+
+    async def connect(self, websocket: WebSocket, username: str, codec: str = "json"):
+        await websocket.accept(subprotocol=None if codec == "json" else codec)
+        conn = Conn(websocket, username, codec)
+        conn.task = asyncio.create_task(self._writer(conn))
+        self.conns[websocket] = conn
+        self._membership_changed()
         # 加入欢迎
         await self.broadcast_system(f"{username} 加入了聊天室")
         # 发送参与者列表
         await self.broadcast_participants()
-        # 发送历史
-        await websocket.send_json({"type": "history", "data": self.history})
+        # 发送历史（新用户共享同一份已编码/压缩的历史帧）
+        frame = self._history_frames.get(codec)
+        if frame is None:
+            frame = self._history_frames[codec] = encode_frame(codec, {"type": "history", "data": list(self.history)})
+        self._enqueue(conn, frame)
+
+    def disconnect(self, websocket: WebSocket) -> Optional[Conn]:
+        conn = self.conns.pop(websocket, None)
+        if conn is None:
+            return None
+        self._membership_changed()
+        # 让写协程发完已排队的帧后退出；队列已满则直接取消
+        try:
+            conn.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            conn.task.cancel()
+        # 断开时不立即广播；由上层调用，并在返回前 await drain(conn)
+        return conn
+
+    async def drain(self, conn: Optional[Conn], timeout: float = DRAIN_TIMEOUT):
+        # ASGI 处理函数返回后连接即不可再写：在此之前等写协程发完已排队的帧（如错误提示）
+        if conn is None or conn.task is None:
+            return
+        _, pending = await asyncio.wait({conn.task}, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    def _membership_changed(self):
+        self._snapshot = tuple(self.conns.values())
+        self._participants = None
+        self._participants_frames.clear()
+
+    async def _writer(self, conn: Conn):
+        # 每个连接一个写协程：慢客户端只会堵住自己的队列
+        batch = CODECS[conn.codec].batch
+        try:
+            while True:
+                frame = await conn.queue.get()
+                if frame is None:
+                    break
+                # 一次唤醒把已排队的帧一并取出，合并成 batch 帧发送
+                frames = [frame]
+                done = False
+                while len(frames) < SEND_BATCH_MAX:
+                    try:
+                        frame = conn.queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if frame is None:
+                        done = True
+                        break
+                    frames.append(frame)
+                for out in coalesce(frames, batch):
+                    await conn.ws.send_bytes(out)
+                if done:
+                    break
+        except Exception:
+            # 连接已断，剩余帧丢弃；离场由接收循环处理
+            pass
 
-    def disconnect(self, websocket: WebSocket):
-        username = self.usernames.get(websocket, "访客")
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        self.usernames.pop(websocket, None)
-        # 断开时不立即广播；由上层调用
-        return username
+    async def _close_slow(self, conn: Conn):
+        try:
+            await conn.ws.close(code=1013)  # Try Again Later
+        except Exception:
+            pass
+
+    def _enqueue(self, conn: Conn, frame: bytes):
+        try:
+            conn.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # 积压过多：停止写入并关闭连接
+            if not conn.closing:
+                conn.closing = True
+                conn.task.cancel()
+                task = asyncio.create_task(self._close_slow(conn))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
 
     async def send_personal(self, websocket: WebSocket, message: Dict):
-        await websocket.send_json(message)
+        conn = self.conns.get(websocket)
+        if conn is None:
+            return
+        self._enqueue(conn, encode_frame(conn.codec, message))
+
+    async def send_notice(self, websocket: WebSocket, text: str):
+        # 固定文案的系统提示：直接复用缓存的已编码帧
+        conn = self.conns.get(websocket)
+        if conn is None:
+            return
+        self._enqueue(conn, notice_frame(conn.codec, text))
+
+    async def send_all(self, message: Dict, frames: Optional[Dict[str, bytes]] = None):
+        # 按编解码分组：每种编码只编码一次，同组连接复用同一帧；入队不阻塞
+        # frames 可传入调用方的缓存，跨多次广播复用已编码的帧
+        # 先为在线用到的每种编码都编好帧再入队：任一编码失败时不会只有部分连接收到
+        if frames is None:
+            frames = {}
+        for codec in {conn.codec for conn in self._snapshot}:
+            if codec not in frames:
+                frames[codec] = encode_frame(codec, message)
+        for conn in self._snapshot:
+            self._enqueue(conn, frames[conn.codec])
 
     async def broadcast(self, message: Dict):
-        # 裁剪历史
+        # 先编码并广播：编码失败时直接抛出，消息不会进入历史
+        await self.send_all(message)
+        # 记入历史（deque 自动裁剪）
         if message.get("type") in {"chat", "image", "file", "system"}:
             self.history.append(message)
-            if len(self.history) > self.max_history:
-                self.history = self.history[-self.max_history:]
-        # 广播
-        for conn in list(self.active_connections):
-            try:
-                await conn.send_json(message)
-            except Exception:
-                # 某些连接可能已断，忽略
-                pass
+            self._history_frames.clear()
 
     async def broadcast_system(self, text: str):
         await self.broadcast({
             "type": "system",
             "data": text,
-            "ts": datetime.now().strftime("%H:%M:%S")
+            "ts": now_ts()
         })
 
     async def broadcast_participants(self):
-        users = [self.usernames.get(ws, "访客") for ws in self.active_connections]
-        for conn in list(self.active_connections):
-            try:
-                await conn.send_json({"type": "participants", "data": users})
-            except Exception:
-                pass
+        if self._participants is None:
+            users = [conn.username for conn in self._snapshot]
+            self._participants = {"type": "participants", "data": users}
+        await self.send_all(self._participants, self._participants_frames)
 
 manager = ConnectionManager()
 
@@ -151,12 +423,11 @@ def index():
 # ----------------------------
 # 路由：上传任意文件
 # ----------------------------
-MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB，按需调整
-
 @app.post("/upload")
 async def upload(file: UploadFile = File(...)):
-    # 尺寸限制（FastAPI 若未启服务端 limit，可在此读取检测）
-    # 这里直接保存到磁盘；如需严格尺寸校验，可先读取到内存/临时文件判断大小
+    # 表单解析时已得知文件大小：超限直接拒绝，不再复制到上传目录
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=TOO_LARGE)
     raw_name = file.filename or "file"
     safe_name = sanitize_filename(raw_name)
     # 如果清掉后没有后缀，可以保留原后缀
@@ -164,21 +435,20 @@ async def upload(file: UploadFile = File(...)):
     if orig_suffix and not safe_name.endswith(orig_suffix):
         safe_name = f"{safe_name}{orig_suffix}"
 
-    dest_path = unique_path(UPLOAD_DIR, safe_name)
+    # 先流式写入临时文件，校验通过后再改名，半截文件不会以正式文件名出现
+    # 磁盘读写放到线程池，避免阻塞事件循环上的 WebSocket 收发
+    tmp_path = UPLOAD_DIR / f".{uuid.uuid4().hex}.part"
+    try:
+        size = await run_in_threadpool(save_stream, file.file, tmp_path, MAX_UPLOAD_SIZE)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if size > MAX_UPLOAD_SIZE:
+        tmp_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail=TOO_LARGE)
 
-    # 将内容流式写入磁盘，避免一次性读入内存
-    size = 0
-    with dest_path.open("wb") as f:
-        while True:
-            chunk = await file.read(1024 * 1024)  # 1MB
-            if not chunk:
-                break
-            size += len(chunk)
-            if size > MAX_UPLOAD_SIZE:
-                try: dest_path.unlink(missing_ok=True)
-                except Exception: pass
-                raise HTTPException(status_code=413, detail="文件过大（>10MB）")
-            f.write(chunk)
+    dest_path = unique_path(UPLOAD_DIR, safe_name)
+    tmp_path.rename(dest_path)
 
     # 返回可访问 URL（相对路径即可）
     url = f"/static/uploads/{dest_path.name}"
@@ -187,52 +457,59 @@ async def upload(file: UploadFile = File(...)):
 # ----------------------------
 # WebSocket：聊天
 # ----------------------------
+# 图片/文件消息只允许引用本站上传的资源与内置贴纸
+ALLOWED_PREFIXES = ("/static/uploads/", "/static/stickers/")
+
 @app.websocket("/ws")
 async def ws_endpoint(websocket: WebSocket):
     # 取用户名（缺省为访客+随机）
     username = websocket.query_params.get("username") or f"访客{int(time.time())%1000}"
+    codec = negotiate_codec(websocket)
+    loads = CODECS[codec].loads
     try:
-        await manager.connect(websocket, username)
+        await manager.connect(websocket, username, codec)
         while True:
-            data_text = await websocket.receive_text()
-            # 简单 JSON 解析
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            # 前端以二进制帧发送，直接解析 bytes 免去解码成 str；文本帧仍兼容（msgpack 仅接受二进制帧）
             try:
-                import json
-                payload = json.loads(data_text)
-            except Exception:
-                await manager.send_personal(websocket, {"type": "system", "data": "消息格式错误"})
+                payload = loads(message.get("bytes") or message.get("text") or b"")
+            except (ValueError, TypeError):
+                await manager.send_notice(websocket, "消息格式错误")
                 continue
 
             msg_type = payload.get("type")
             msg_data = payload.get("data")
             msg_name = payload.get("name")  # 文件/图片名
+            # name 会原样进入广播与历史：只接受字符串，避免无法编码的值（深层嵌套等）污染历史
+            if msg_name is not None and not isinstance(msg_name, str):
+                await manager.send_notice(websocket, "文件名非法")
+                continue
 
             # 附上时间戳与发送者
             envelope = {
                 "type": msg_type,
-                "user": manager.usernames.get(websocket, "访客"),
+                "user": username,
                 "data": msg_data,
                 "name": msg_name,
-                "ts": datetime.now().strftime("%H:%M:%S"),
+                "ts": now_ts(),
             }
 
             # 基础校验与白名单
             if msg_type == "chat":
                 if not isinstance(msg_data, str) or not msg_data.strip():
-                    await manager.send_personal(websocket, {"type": "system", "data": "空消息无法发送"})
+                    await manager.send_notice(websocket, "空消息无法发送")
                     continue
                 await manager.broadcast(envelope)
 
             elif msg_type in {"image", "file"}:
                 # 仅允许本站上传的静态资源/贴纸
                 if not isinstance(msg_data, str):
-                    await manager.send_personal(websocket, {"type": "system", "data": "文件地址非法"})
+                    await manager.send_notice(websocket, "文件地址非法")
                     continue
-                if not (
-                    msg_data.startswith("/static/uploads/") or
-                    msg_data.startswith("/static/stickers/")
-                ):
-                    await manager.send_personal(websocket, {"type": "system", "data": "非法资源地址"})
+                if not msg_data.startswith(ALLOWED_PREFIXES):
+                    await manager.send_notice(websocket, "非法资源地址")
                     continue
                 # 服务器不再限制类型：任意文件都走 'file'，图片走 'image'
                 await manager.broadcast(envelope)
@@ -245,9 +522,10 @@ async def ws_endpoint(websocket: WebSocket):
                 await manager.send_personal(websocket, {"type": "system", "data": f"未知消息类型：{msg_type}"})
 
     except WebSocketDisconnect:
-        user = manager.disconnect(websocket)
-        await manager.broadcast_system(f"{user} 离开了聊天室")
+        conn = manager.disconnect(websocket)
+        await manager.broadcast_system(f"{conn.username if conn else '访客'} 离开了聊天室")
         await manager.broadcast_participants()
+        await manager.drain(conn)
     except Exception as e:
         # 兜底异常
         try:
@@ -255,6 +533,20 @@ async def ws_endpoint(websocket: WebSocket):
         except Exception:
             pass
         finally:
-            user = manager.disconnect(websocket)
-            await manager.broadcast_system(f"{user} 离开了聊天室")
+            conn = manager.disconnect(websocket)
+            await manager.broadcast_system(f"{conn.username if conn else '访客'} 离开了聊天室")
             await manager.broadcast_participants()
+            await manager.drain(conn)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # 本地运行入口：loop 用 auto，装了 uvloop 就用，否则回退到 asyncio（Dockerfile 中固定为 uvloop）
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "8000")),
+        loop="auto",
+        http="httptools",
+        ws_per_message_deflate=False,
+    )